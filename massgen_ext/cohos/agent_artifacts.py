@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Works both per line (.match) and over a whole log (.finditer); the separator must not cross a line break.
+AGENT_LINE = re.compile(r"^\[([A-Za-z0-9_\-]+)\][^\S\r\n]?([^\r\n]*)\r?$", re.MULTILINE)
+
+# str.splitlines() boundaries other than \n and \r\n.
+_RARE_LINE_BREAK = re.compile(r"[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]|\r(?!\n)")
+
+# Heuristic mapping by canonical names used in your config: (agent ids in priority order, artifact path).
+_AGENT_MAP: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("information_gatherer", "gatherer"), "artifacts/context_information_gatherer.txt"),
+    (("domain_expert", "expert"), "artifacts/candidates_domain_expert.txt"),
+    (("synthesizer", "synth"), "artifacts/final_synthesizer.txt"),
+)
+
+
+class AgentTextCollector:
+    """
+    Accumulates agent-tagged stdout lines ("[agent] chunk") into per-agent text.
+    Can be fed incrementally while MassGen streams, or with a full log after the fact.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, List[str]] = defaultdict(list)
+
+    def feed(self, line: str) -> None:
+        # A raw stdout line may still carry str.splitlines() breaks (bare \r, form feed, ...);
+        # split on them so streaming matches the after-the-fact parse.
+        for part in line.splitlines():
+            m = AGENT_LINE.match(part)
+            if m:
+                self._buckets[m.group(1)].append(m.group(2))
+
+    def feed_text(self, text: str) -> None:
+        if _RARE_LINE_BREAK.search(text):
+            # AGENT_LINE's MULTILINE anchors only know \n; keep str.splitlines() semantics.
+            for line in text.splitlines():
+                self.feed(line)
+            return
+        # One finditer pass keeps the scan loop in C instead of matching line by line.
+        for m in AGENT_LINE.finditer(text):
+            self._buckets[m.group(1)].append(m.group(2))
+
+    def texts(self) -> Dict[str, str]:
+        joined = {k: "".join(v).strip() for k, v in self._buckets.items()}
+        return {k: s for k, s in joined.items() if s}
+
+
+def write_artifact(run_dir: Path, rel: str, content: str) -> Path:
+    out = run_dir / rel
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(content.strip() + "\n", encoding="utf-8")
+    return out
+
+
+def write_agent_artifacts(run_dir: Path, texts: Dict[str, str]) -> List[Path]:
+    """
+    Write per-agent artifacts plus artifacts/index.txt; returns every file written (index last).
+    """
+    written = []
+    for names, rel in _AGENT_MAP:
+        content = next((texts[k] for k in names if k in texts), "")
+        if content:
+            written.append(write_artifact(run_dir, rel, content))
+
+    # Always write an index for auditability
+    idx = run_dir / "artifacts" / "index.txt"
+    idx.parent.mkdir(parents=True, exist_ok=True)
+    idx.write_text("Written artifacts:\n" + "\n".join(str(p.relative_to(run_dir)) for p in written) + "\n", encoding="utf-8")
+
+    return written + [idx]
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import functools
 import hashlib
 import json
+import mmap
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
@@ -16,30 +19,98 @@ class BundlePaths:
     policy_copy_path: Path
     manifest_path: Path
     hashes_path: Path
+    advisory_path: Path
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_cached(p: Path, cwd: Optional[str]) -> Path:
+    return p.resolve()
+
+
+def resolve_path(p: str) -> Path:
+    """
+    Cached expanduser().resolve() for read-only inputs (policy, config, launcher).
+    Results are never invalidated, so a later symlink retarget is not seen; do not
+    use this for output directories.
+    """
+    ep = Path(p).expanduser()
+    # Only relative paths depend on the cwd (and only they need it to exist).
+    return _resolve_cached(ep, None if ep.is_absolute() else os.getcwd())
 
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _sha256_file(p: Path) -> str:
-    h = hashlib.sha256()
-    with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# Above this size, hash straight from the page cache via mmap instead of read() copies.
+_MMAP_MIN_BYTES = 4 * 1024 * 1024
+
+
+def _sha256_file(p: Path, sample_bytes: int = 0) -> str:
+    if sample_bytes > 0:
+        # Prefix-only digest for runs that opt out of full audit hashing.
+        with p.open("rb") as f:
+            return hashlib.sha256(f.read(sample_bytes)).hexdigest()
+
+    if p.stat().st_size > _MMAP_MIN_BYTES:
+        h = hashlib.sha256()
+        with p.open("rb", buffering=0) as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as mv:
+                h.update(mv)
+        return h.hexdigest()
 
+    # Unbuffered so file_digest owns the read size (read/update loop runs in C).
+    with p.open("rb", buffering=0) as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
-def _write_json_atomic(path: Path, obj: Dict[str, Any]) -> None:
+
+def _fsync_dir(d: Path) -> None:
+    # Directory fds are POSIX-only; elsewhere the rename is the best we can do.
+    if os.name != "posix":
+        return
+    fd = os.open(d, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _dumps_json(obj: Dict[str, Any], *, compact: bool = False) -> bytes:
+    # Stdlib only, so artifact bytes are identical on every host.
+    # Sorted keys either way; compact drops indentation for machine-read artifacts.
+    if compact:
+        text = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    else:
+        text = json.dumps(obj, indent=2, sort_keys=True)
+    return (text + "\n").encode("utf-8")
+
+
+def _write_json_atomic(path: Path, obj: Dict[str, Any], *, atomic: bool = True, compact: bool = False) -> None:
+    """
+    atomic=True: tmp file + fsync + rename + parent dir fsync (crash-safe).
+    atomic=False: write in place, for single-writer artifacts that are not safety-critical.
+    compact=True: no indentation, for large machine-read artifacts such as hashes.json.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
+    data = _dumps_json(obj, compact=compact)
+    if not atomic:
+        with path.open("wb") as f:
+            f.write(data)
+        return
+
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, sort_keys=True)
-        f.write("\n")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
     os.replace(tmp, path)
+    _fsync_dir(path.parent)
 
 
 def init_bundle(run_dir: str) -> BundlePaths:
+    # Not cached: the output dir must reflect the filesystem now (e.g. a retargeted "latest" symlink).
     rd = Path(run_dir).expanduser().resolve()
     rd.mkdir(parents=True, exist_ok=True)
     return BundlePaths(
@@ -48,23 +119,24 @@ def init_bundle(run_dir: str) -> BundlePaths:
         policy_copy_path=rd / "policy.json",
         manifest_path=rd / "manifest.json",
         hashes_path=rd / "hashes.json",
+        advisory_path=rd / "massgen_advisory.json",
     )
 
 
 def write_policy_copy(bundle: BundlePaths, policy_obj: Dict[str, Any]) -> None:
-    _write_json_atomic(bundle.policy_copy_path, policy_obj)
+    # Caller-supplied copy of the input policy; not part of the crash-safety contract.
+    _write_json_atomic(bundle.policy_copy_path, policy_obj, atomic=False)
 
 
-def write_decision(
-    bundle: BundlePaths,
+def _decision_obj(
     *,
     decision: str,
     reason: str,
     policy_id: str,
     run_id: str,
     details: Optional[Dict[str, Any]] = None,
-) -> None:
-    obj: Dict[str, Any] = {
+) -> Dict[str, Any]:
+    return {
         "schema": "cohos.decision.v1",
         "run_id": run_id,
         "policy_id": policy_id,
@@ -73,10 +145,39 @@ def write_decision(
         "ts_utc": _utc_now_iso(),
         "details": details or {},
     }
+
+
+def write_decision(
+    bundle: BundlePaths,
+    *,
+    decision: str,
+    reason: str,
+    policy_id: str,
+    run_id: str,
+    details: Optional[Dict[str, Any]] = None,
+) -> None:
+    obj = _decision_obj(decision=decision, reason=reason, policy_id=policy_id, run_id=run_id, details=details)
     _write_json_atomic(bundle.decision_path, obj)
 
 
-def write_manifest_and_hashes(bundle: BundlePaths, extra_files: Optional[List[Path]] = None) -> None:
+def _sha256_if_exists(p: Path, sample_bytes: int = 0) -> Optional[str]:
+    try:
+        return _sha256_file(p, sample_bytes)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest_and_hashes(
+    bundle: BundlePaths,
+    extra_files: Optional[List[Path]] = None,
+    *,
+    emit_hashes: bool = True,
+    hash_sample_bytes: int = 0,
+) -> None:
+    """
+    emit_hashes=False: hashes.json is still written, with an empty sha256 map and mode "skipped".
+    hash_sample_bytes > 0: each digest covers only the first N bytes of the file (mode "sample").
+    """
     files: List[Path] = [
         bundle.decision_path,
         bundle.policy_copy_path,
@@ -84,20 +185,75 @@ def write_manifest_and_hashes(bundle: BundlePaths, extra_files: Optional[List[Pa
     if extra_files:
         files.extend(extra_files)
 
-    # Only include files that exist (defensive).
-    files = [p for p in files if p.exists()]
+    if emit_hashes:
+        # hashlib releases the GIL while hashing, so threads overlap the I/O-bound reads.
+        # ex.map preserves input order, keeping the output deterministic.
+        hash_one = functools.partial(_sha256_if_exists, sample_bytes=hash_sample_bytes)
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as ex:
+            digests = list(ex.map(hash_one, files))
+
+        # Only include files that exist (defensive); hashing doubles as the existence check.
+        present = [(p, d) for p, d in zip(files, digests) if d is not None]
+    else:
+        present = [(p, None) for p in files if p.exists()]
+    rel = [str(p.relative_to(bundle.run_dir)) for p, _ in present]
+
+    # One timestamp for both artifacts so manifest and hashes agree.
+    now = _utc_now_iso()
 
     manifest = {
         "schema": "cohos.manifest.v1",
         "run_dir": str(bundle.run_dir),
-        "ts_utc": _utc_now_iso(),
-        "files": [str(p.relative_to(bundle.run_dir)) for p in files],
+        "ts_utc": now,
+        "files": rel,
     }
     _write_json_atomic(bundle.manifest_path, manifest)
 
-    hashes = {
+    hashes: Dict[str, Any] = {
         "schema": "cohos.hashes.v1",
-        "ts_utc": _utc_now_iso(),
-        "sha256": {str(p.relative_to(bundle.run_dir)): _sha256_file(p) for p in files + [bundle.manifest_path]},
+        "ts_utc": now,
     }
-    _write_json_atomic(bundle.hashes_path, hashes)
+    if not emit_hashes:
+        hashes.update({"mode": "skipped", "sha256": {}})
+    else:
+        sha256 = dict(zip(rel, (d for _, d in present)))
+        sha256[bundle.manifest_path.name] = _sha256_file(bundle.manifest_path, hash_sample_bytes)
+        hashes.update({"mode": "full", "sha256": sha256})
+        if hash_sample_bytes > 0:
+            hashes.update({"mode": "sample", "sample_bytes": hash_sample_bytes})
+    _write_json_atomic(bundle.hashes_path, hashes, compact=True)
+
+
+def write_bundle_finalize(
+    bundle: BundlePaths,
+    *,
+    decision: str,
+    reason: str,
+    policy_id: str,
+    run_id: str,
+    details: Optional[Dict[str, Any]] = None,
+    advisory: Optional[Dict[str, Any]] = None,
+    extra_files: Optional[List[Path]] = None,
+    emit_hashes: bool = True,
+    hash_sample_bytes: int = 0,
+) -> None:
+    """
+    Finalize a bundle in two phases:
+    1. decision.json and (if given) massgen_advisory.json, written concurrently.
+    2. manifest.json then hashes.json, which must observe phase 1 on disk; hashes.json
+       covers manifest.json, so these two stay sequential (file hashing is already threaded).
+    """
+    obj = _decision_obj(decision=decision, reason=reason, policy_id=policy_id, run_id=run_id, details=details)
+    files: List[Path] = []
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [ex.submit(_write_json_atomic, bundle.decision_path, obj)]
+        if advisory is not None:
+            # Advisory output from MassGen, not the decision of record; no atomic rename needed.
+            futures.append(ex.submit(_write_json_atomic, bundle.advisory_path, advisory, atomic=False))
+            files.append(bundle.advisory_path)
+        for fut in futures:
+            fut.result()
+
+    if extra_files:
+        files.extend(extra_files)
+    write_manifest_and_hashes(bundle, extra_files=files, emit_hashes=emit_hashes, hash_sample_bytes=hash_sample_bytes)
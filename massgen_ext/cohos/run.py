@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import json
 import os
+import signal
 import subprocess
 import sys
+import threading
 import time
-import uuid
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple, List
 
 from . import reasons
-from .artifacts import init_bundle, write_decision, write_manifest_and_hashes, write_policy_copy
+from .agent_artifacts import AgentTextCollector, write_agent_artifacts
+from .artifacts import (
+    init_bundle,
+    resolve_path,
+    write_bundle_finalize,
+    write_decision,
+    write_manifest_and_hashes,
+    write_policy_copy,
+)
 
 
 @dataclass(frozen=True)
@@ -23,10 +32,13 @@ class Policy:
     # If true, wrapper refuses if API key env vars are present (prevents accidental live calls).
     forbid_live_keys: bool = False
     allow_live_keys: bool = False
+    # Audit hashing: emit_hashes=False skips SHA-256 entirely; hash_sample_bytes > 0 hashes only each file's prefix.
+    emit_hashes: bool = True
+    hash_sample_bytes: int = 0
 
 
 def _load_json(path: str) -> Dict[str, Any]:
-    p = Path(path).expanduser().resolve()
+    p = resolve_path(path)
     with p.open("r", encoding="utf-8") as f:
         return json.load(f)
 
@@ -46,6 +58,11 @@ def _parse_policy(policy_obj: Dict[str, Any]) -> Policy:
     forbid_live_keys = bool(policy_obj.get("forbid_live_keys", False))
     allow_live_keys = bool(policy_obj.get("allow_live_keys", False))
 
+    emit_hashes = bool(policy_obj.get("emit_hashes", True))
+    hash_sample_bytes = int(policy_obj.get("hash_sample_bytes", 0))
+    if hash_sample_bytes < 0:
+        raise ValueError("hash_sample_bytes must be >= 0")
+
     return Policy(
         policy_id=policy_id,
         require_massgen_success=require_massgen_success,
@@ -53,15 +70,67 @@ def _parse_policy(policy_obj: Dict[str, Any]) -> Policy:
         massgen_args=massgen_args,
         forbid_live_keys=forbid_live_keys,
         allow_live_keys=allow_live_keys,
+        emit_hashes=emit_hashes,
+        hash_sample_bytes=hash_sample_bytes,
+    )
+
+
+# Non-secret vars passed through to the MassGen subprocess by default. Matched case-insensitively
+# (proxy vars are often lower-case); any LC_*, *_BASE_URL and *_ENDPOINT var is passed as well.
+_ENV_PASSTHROUGH = frozenset({
+    "PATH",
+    "PYTHONPATH",
+    "PYTHONIOENCODING",
+    "HOME",
+    "SHELL",
+    "USER",
+    "LANG",
+    "TERM",
+    "VIRTUAL_ENV",
+    "CONDA_PREFIX",
+    "TMPDIR",
+    # Proxies and CA bundles
+    "HTTP_PROXY",
+    "HTTPS_PROXY",
+    "ALL_PROXY",
+    "NO_PROXY",
+    "SSL_CERT_FILE",
+    "SSL_CERT_DIR",
+    "REQUESTS_CA_BUNDLE",
+    "CURL_CA_BUNDLE",
+    "NODE_EXTRA_CA_CERTS",
+    # Windows: a Python child cannot start without SYSTEMROOT
+    "SYSTEMROOT",
+    "COMSPEC",
+    "PATHEXT",
+    "TEMP",
+    "TMP",
+    "USERPROFILE",
+    "APPDATA",
+    "LOCALAPPDATA",
+})
+_ENV_PASSTHROUGH_PREFIXES = ("LC_",)
+_ENV_PASSTHROUGH_SUFFIXES = ("_BASE_URL", "_ENDPOINT")
+
+
+def _env_passthrough(name: str) -> bool:
+    upper = name.upper()
+    return (
+        upper in _ENV_PASSTHROUGH
+        or upper.startswith(_ENV_PASSTHROUGH_PREFIXES)
+        or upper.endswith(_ENV_PASSTHROUGH_SUFFIXES)
     )
 
 
 def _env_sanitized(policy: Policy) -> Tuple[Dict[str, str], Dict[str, Any]]:
     """
     Do not record or pass provider secrets unless user explicitly wants that.
-    Canon-default: strip known key vars from subprocess env to prevent accidental live calls.
+    Canon-default: build the subprocess env from an allowlist, so known key vars
+    (and anything else not listed) never reach MassGen by accident.
+    With allow_live_keys the full environment is passed, so live backend config
+    (endpoints, credentials files, extra provider keys) keeps working.
     """
-    base = dict(os.environ)
+    environ = os.environ
 
     secret_vars = [
         "OPENAI_API_KEY",
@@ -74,36 +143,58 @@ def _env_sanitized(policy: Policy) -> Tuple[Dict[str, str], Dict[str, Any]]:
         "AZURE_OPENAI_KEY",
     ]
 
-    present = [k for k in secret_vars if base.get(k)]
+    present = [k for k in secret_vars if environ.get(k)]
     if policy.forbid_live_keys and present:
         raise RuntimeError(f"Live key env vars present but forbidden by policy: {present}")
 
     stripped = []
     passed = []
     if policy.allow_live_keys:
+        base = dict(environ)
         passed = present
     else:
-        # Strip by default (prevents accidental network calls during tests).
-        for k in secret_vars:
-            base.pop(k, None)
+        # Secrets are never in the allowlist (prevents accidental network calls during tests).
+        base = {k: v for k, v in environ.items() if _env_passthrough(k)}
         stripped = present
 
     allowlist_record = ["PATH", "PYTHONPATH", "VIRTUAL_ENV", "CONDA_PREFIX", "HOME", "SHELL"]
-    env_record = {k: os.environ.get(k) for k in allowlist_record if os.environ.get(k) is not None}
+    env_record = {k: environ.get(k) for k in allowlist_record if environ.get(k) is not None}
 
     return base, {"env_allowlist": env_record, "stripped_secret_vars": stripped, "passed_secret_vars": passed}
 
 
+# How long to keep draining stdout once MassGen has exited. A descendant that inherited the
+# pipe (MCP server, docker, CLI backend) must not hold the run open past this: it is killed
+# with the rest of MassGen's process group, and the tee gets a short grace to reach EOF.
+# Only a process that left that group (or any descendant on Windows) can survive; the reader
+# thread then stays blocked and closes the pipe once that process exits.
+_STDOUT_DRAIN_S = 5.0
+_STDOUT_KILL_GRACE_S = 1.0
+
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    # On POSIX the child leads its own session, so this also reaches its descendants.
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        proc.kill()
+
+
 def _invoke_massgen_advisory(
     *,
     policy: Policy,
     prompt: str,
     run_dir: Path,
-) -> Tuple[bool, Dict[str, Any], Path, Path, Path]:
+) -> Tuple[bool, Dict[str, Any], Path, Path, Path, List[Path]]:
     """
     Real MassGen invocation (advisory-only from CohOS perspective):
     - Calls the massgen CLI
-    - Captures stdout/stderr
+    - Streams stdout to the log while collecting agent-tagged lines (no re-read of the log)
+    - Captures stderr
+    - Writes per-agent artifacts from the streamed output
     - Records invocation metadata (sanitized env)
     """
     massgen_bin = (Path(sys.executable).resolve().parent / "massgen")
@@ -126,25 +217,75 @@ def _invoke_massgen_advisory(
     base_cmd.append(prompt)
 
     env, env_meta = _env_sanitized(policy)
+    run_dir_str = str(run_dir)
+
+    timeout_s = max(10, int(policy.orchestrator_timeout_s) + 30)
+    collector = AgentTextCollector()
 
     t0 = time.time()
-    with stdout_path.open("w", encoding="utf-8") as out, stderr_path.open("w", encoding="utf-8") as err:
+    # stdout is teed through Python line by line, so give it a 64 KiB buffer to batch write() calls;
+    # the child writes stderr straight to the fd.
+    with stdout_path.open("wb", buffering=1 << 16) as out, stderr_path.open("w", encoding="utf-8") as err:
         try:
-            cp = subprocess.run(
+            proc = subprocess.Popen(
                 base_cmd,
-                cwd=str(run_dir),
+                cwd=run_dir_str,
                 env=env,
-                stdout=out,
+                stdout=subprocess.PIPE,
                 stderr=err,
-                text=True,
-                timeout=max(10, int(policy.orchestrator_timeout_s) + 30),
+                # Only the explicit stdio redirections reach the child: Python-opened fds are
+                # non-inheritable (PEP 446), so the child-side fd-closing pass can be skipped.
+                close_fds=False,
+                # Own process group, so a timeout kills MassGen together with its descendants.
+                start_new_session=(os.name == "posix"),
             )
-            rc = int(cp.returncode)
-            ok = (rc == 0)
-        except subprocess.TimeoutExpired as e:
-            ok = False
-            rc = 124
-            err.write(f"\n[COHOS] TimeoutExpired: {e}\n")
+
+            # Tee on a reader thread: raw bytes to the log, decoded lines to the agent collector.
+            # The lock lets us stop the tee cleanly if a descendant keeps the pipe open after exit.
+            tee_lock = threading.Lock()
+            tee_stop = threading.Event()
+
+            def _tee() -> None:
+                # The reader owns the pipe and closes it on EOF or stop.
+                with proc.stdout:
+                    for raw in proc.stdout:
+                        with tee_lock:
+                            if tee_stop.is_set():
+                                return
+                            out.write(raw)
+                            collector.feed(raw.decode("utf-8", errors="replace"))
+
+            reader = threading.Thread(target=_tee, name="cohos-massgen-stdout", daemon=True)
+            reader.start()
+
+            timed_out = False
+            try:
+                try:
+                    rc = int(proc.wait(timeout=timeout_s))
+                except subprocess.TimeoutExpired:
+                    _kill_process_group(proc)
+                    rc = int(proc.wait())
+                    # Only a real kill counts; MassGen may have exited on its own just before.
+                    timed_out = rc < 0 if os.name == "posix" else True
+            finally:
+                if proc.poll() is None:
+                    # Interrupted while waiting (e.g. KeyboardInterrupt): do not orphan the group.
+                    _kill_process_group(proc)
+                reader.join(_STDOUT_DRAIN_S)
+                if reader.is_alive():
+                    # MassGen has exited but a descendant still holds stdout: kill what is left of
+                    # its process group so nothing leaks into the next run, then let the tee see EOF.
+                    _kill_process_group(proc)
+                    reader.join(_STDOUT_KILL_GRACE_S)
+                with tee_lock:
+                    tee_stop.set()
+
+            if timed_out:
+                ok = False
+                rc = 124
+                err.write(f"\n[COHOS] TimeoutExpired: {base_cmd!r} timed out after {timeout_s} seconds\n")
+            else:
+                ok = (rc == 0)
         except Exception as e:
             ok = False
             rc = 2
@@ -152,10 +293,12 @@ def _invoke_massgen_advisory(
 
     wall_s = round(time.time() - t0, 3)
 
+    agent_artifacts = write_agent_artifacts(run_dir, collector.texts())
+
     inv = {
         "schema": "cohos.massgen_invocation.v1",
         "cmd": base_cmd,
-        "cwd": str(run_dir),
+        "cwd": run_dir_str,
         "returncode": rc,
         "ok": ok,
         "wall_s": wall_s,
@@ -170,15 +313,17 @@ def _invoke_massgen_advisory(
         "stdout_log": str(stdout_path.name),
         "stderr_log": str(stderr_path.name),
         "invocation": str(inv_path.name),
+        "agent_artifacts": [str(p.relative_to(run_dir)) for p in agent_artifacts],
         "notes": "CohOS wrapper treats MassGen as advisory-only; decision authority remains external.",
     }
 
-    return ok, advisory, stdout_path, stderr_path, inv_path
+    return ok, advisory, stdout_path, stderr_path, inv_path, agent_artifacts
 
 
 def cohos_run(*, policy_path: str, prompt: str, out_dir: str) -> str:
-    run_id = f"massgen-cohos-{uuid.uuid4().hex[:12]}"
+    run_id = f"massgen-cohos-{os.urandom(6).hex()}"
     bundle = init_bundle(out_dir)
+    run_dir_str = str(bundle.run_dir)
 
     decision = "REFUSE"
     reason = reasons.INTERNAL_ERROR_STEP_FAIL
@@ -198,14 +343,11 @@ def cohos_run(*, policy_path: str, prompt: str, out_dir: str) -> str:
             write_policy_copy(bundle, policy_obj)
             write_decision(bundle, decision=decision, reason=reason, policy_id=policy_id, run_id=run_id, details=details)
             write_manifest_and_hashes(bundle)
-            return str(bundle.run_dir)
+            return run_dir_str
 
         write_policy_copy(bundle, policy_obj)
 
-        ok, advisory, sp_out, sp_err, sp_inv = _invoke_massgen_advisory(policy=policy, prompt=prompt, run_dir=bundle.run_dir)
-
-        advisory_path = bundle.run_dir / "massgen_advisory.json"
-        advisory_path.write_text(json.dumps(advisory, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        ok, advisory, sp_out, sp_err, sp_inv, sp_artifacts = _invoke_massgen_advisory(policy=policy, prompt=prompt, run_dir=bundle.run_dir)
 
         # Gate per policy.
         if policy.require_massgen_success and not ok:
@@ -217,9 +359,19 @@ def cohos_run(*, policy_path: str, prompt: str, out_dir: str) -> str:
             reason = reasons.ALLOW_ALL_CHECKS_PASS
             details.update({"massgen_ok": ok})
 
-        write_decision(bundle, decision=decision, reason=reason, policy_id=policy_id, run_id=run_id, details=details)
-        write_manifest_and_hashes(bundle, extra_files=[advisory_path, sp_out, sp_err, sp_inv])
-        return str(bundle.run_dir)
+        write_bundle_finalize(
+            bundle,
+            decision=decision,
+            reason=reason,
+            policy_id=policy_id,
+            run_id=run_id,
+            details=details,
+            advisory=advisory,
+            extra_files=[sp_out, sp_err, sp_inv, *sp_artifacts],
+            emit_hashes=policy.emit_hashes,
+            hash_sample_bytes=policy.hash_sample_bytes,
+        )
+        return run_dir_str
 
     except Exception as e:
         details.update({"error": f"EXCEPTION: {type(e).__name__}: {e}"})
@@ -228,7 +380,7 @@ def cohos_run(*, policy_path: str, prompt: str, out_dir: str) -> str:
             write_manifest_and_hashes(bundle)
         except Exception:
             pass
-        return str(bundle.run_dir)
+        return run_dir_str
 
 
 def _usage() -> str:
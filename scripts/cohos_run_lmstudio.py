@@ -3,48 +3,78 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
 import subprocess
 import sys
 import time
-import uuid
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 from massgen_ext.cohos import reasons
-from massgen_ext.cohos.artifacts import init_bundle, write_decision, write_manifest_and_hashes, write_policy_copy
+from massgen_ext.cohos.artifacts import init_bundle, resolve_path, write_decision, write_manifest_and_hashes, write_policy_copy
 
 
 def _load_json(path: str) -> Dict[str, Any]:
-    p = Path(path).expanduser().resolve()
+    p = resolve_path(path)
     return json.loads(p.read_text(encoding="utf-8"))
 
 
+def _iter_files(root: Path) -> Iterator[Path]:
+    # scandir's DirEntry type checks use d_type, so regular entries cost no extra stat().
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield Path(entry.path)
+
+
 def _find_coordination_table(run_dir: Path) -> Path | None:
     base = run_dir / ".massgen" / "massgen_logs"
     if not base.exists():
         return None
-    for t in base.rglob("attempt_1/coordination_table.txt"):
-        return t
-    for t in base.rglob("coordination_table.txt"):
-        return t
-    return None
+    # One scandir walk: the table is spotted by name while listing each dir (no extra stat),
+    # returning immediately for attempt_1 and otherwise falling back to the first one seen.
+    fallback: Path | None = None
+    stack = [str(base)]
+    while stack:
+        d = stack.pop()
+        has_table = False
+        with os.scandir(d) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name == "coordination_table.txt":
+                    has_table = True
+        if has_table:
+            table = Path(d) / "coordination_table.txt"
+            if os.path.basename(d) == "attempt_1":
+                return table
+            if fallback is None:
+                fallback = table
+    return fallback
+
+
+_RESTART_ROW = re.compile(r"^\|\s*Restarts\s*\|(.+?)\|\s*$", re.MULTILINE)
+_RESTART_CELL = re.compile(r"(\d+)\s*restarts?")
 
 
 def _parse_restarts_total(coord_table: Path | None) -> int:
     if coord_table is None or (not coord_table.exists()):
         return 0
-    txt = coord_table.read_text(encoding="utf-8", errors="replace")
-    m = re.search(r"^\|\s*Restarts\s*\|(.+?)\|\s*$", txt, flags=re.MULTILINE)
-    if not m:
+    # Only the Restarts row matters; stop reading as soon as it is found.
+    row = None
+    with coord_table.open("r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            row = _RESTART_ROW.match(line)
+            if row:
+                break
+    if not row:
         return 0
-    cells = [c.strip() for c in m.group(1).split("|")]
-    total = 0
-    for c in cells:
-        mm = re.search(r"(\d+)\s*restarts?", c)
-        if mm:
-            total += int(mm.group(1))
-    return total
+    return sum(int(m.group(1)) for m in _RESTART_CELL.finditer(row.group(1)))
 
 
 def main() -> int:
@@ -54,8 +84,10 @@ def main() -> int:
     ap.add_argument("--prompt", required=True, help="Prompt")
     args = ap.parse_args()
 
-    run_id = f"cohos-lmstudio-{uuid.uuid4().hex[:12]}"
+    run_id = f"cohos-lmstudio-{os.urandom(6).hex()}"
     bundle = init_bundle(args.out)
+    run_dir = bundle.run_dir
+    run_dir_str = str(run_dir)
 
     # refusal-first default
     decision = "REFUSE"
@@ -83,17 +115,28 @@ def main() -> int:
         max_wall_s_allow = float(policy_obj.get("max_wall_s_allow", 420))
         max_wall_s_refuse = float(policy_obj.get("max_wall_s_refuse", 900))
 
-        launcher = Path("scripts/run_massgen_lmstudio.py").resolve()
+        # Audit hashing knobs (see massgen_ext.cohos.run.Policy)
+        emit_hashes = bool(policy_obj.get("emit_hashes", True))
+        hash_sample_bytes = int(policy_obj.get("hash_sample_bytes", 0))
+        if hash_sample_bytes < 0:
+            # Same rejection as massgen_ext.cohos.run._parse_policy.
+            details.update({"error": "POLICY_INVALID: hash_sample_bytes must be >= 0"})
+            write_decision(bundle, decision="REFUSE", reason=reasons.POLICY_INVALID, policy_id=policy_id, run_id=run_id, details=details)
+            write_manifest_and_hashes(bundle)
+            print(run_dir_str)
+            return 1
+
+        launcher = resolve_path("scripts/run_massgen_lmstudio.py")
         if not launcher.exists():
             raise FileNotFoundError(f"launcher not found: {launcher}")
 
-        cfg_abs = str(Path(cfg_path).expanduser().resolve())
+        cfg_abs = str(resolve_path(cfg_path))
 
         cmd: List[str] = [
             sys.executable,
             str(launcher),
             "--config", cfg_abs,
-            "--out", str(bundle.run_dir),
+            "--out", run_dir_str,
             "--prompt", args.prompt,
             "--base-url", base_url,
             "--api-key", api_key,
@@ -102,7 +145,9 @@ def main() -> int:
 
         t0 = time.time()
         try:
-            cp = subprocess.run(cmd, cwd=str(Path.cwd()), timeout=timeout_s)
+            # Inherits our cwd/stdio; with close_fds=False and no cwd= this takes the posix_spawn path.
+            # Python-opened fds are non-inheritable (PEP 446), so nothing else leaks to the child.
+            cp = subprocess.run(cmd, timeout=timeout_s, close_fds=False)
             rc = int(cp.returncode)
             ok = (rc == 0)
             details.update({"launcher_rc": rc, "wall_s": round(time.time() - t0, 3)})
@@ -112,7 +157,7 @@ def main() -> int:
             details.update({"launcher_rc": rc, "wall_s": round(time.time() - t0, 3), "timeout_s": timeout_s})
 
         # Compute orchestration metrics (best-effort)
-        coord_table = _find_coordination_table(bundle.run_dir)
+        coord_table = _find_coordination_table(run_dir)
         restarts_total = _parse_restarts_total(coord_table)
 
         details.update({
@@ -147,19 +192,17 @@ def main() -> int:
         write_decision(bundle, decision=decision, reason=reason, policy_id=policy_id, run_id=run_id, details=details)
 
         extra: List[Path] = []
-        for fp in [bundle.run_dir / "massgen_stdout.log", bundle.run_dir / "massgen_stderr.log", bundle.run_dir / "massgen_invocation.json"]:
+        for fp in [run_dir / "massgen_stdout.log", run_dir / "massgen_stderr.log", run_dir / "massgen_invocation.json"]:
             if fp.exists():
                 extra.append(fp)
 
         # Include files under .massgen (not the directory itself)
-        massgen_dir = bundle.run_dir / ".massgen"
+        massgen_dir = run_dir / ".massgen"
         if massgen_dir.exists():
-            for f in massgen_dir.rglob("*"):
-                if f.is_file():
-                    extra.append(f)
+            extra.extend(_iter_files(massgen_dir))
 
-        write_manifest_and_hashes(bundle, extra_files=extra)
-        print(str(bundle.run_dir))
+        write_manifest_and_hashes(bundle, extra_files=extra, emit_hashes=emit_hashes, hash_sample_bytes=hash_sample_bytes)
+        print(run_dir_str)
         return 0 if decision in ("ALLOW", "MARGINAL") else 1
 
     except Exception as e:
@@ -169,7 +212,7 @@ def main() -> int:
             write_manifest_and_hashes(bundle)
         except Exception:
             pass
-        print(str(bundle.run_dir))
+        print(run_dir_str)
         return 1
 
 
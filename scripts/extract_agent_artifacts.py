@@ -2,34 +2,24 @@
 from __future__ import annotations
 
 import argparse
-import re
+import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict
 
-AGENT_LINE = re.compile(r"^\[([A-Za-z0-9_\-]+)\]\s?(.*)$")
+# Add project root to path so `python3 scripts/extract_agent_artifacts.py` works without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-def load_lines(p: Path) -> List[str]:
-    return p.read_text(encoding="utf-8", errors="replace").splitlines()
+from massgen_ext.cohos.agent_artifacts import AgentTextCollector, write_agent_artifacts  # noqa: E402
 
-def reconstruct_from_stdout(stdout_path: Path) -> Dict[str, str]:
-    buckets: Dict[str, List[str]] = {}
-    for line in load_lines(stdout_path):
-        m = AGENT_LINE.match(line.strip("\n"))
-        if not m:
-            continue
-        agent = m.group(1)
-        chunk = m.group(2)
-        # ignore pure empties to reduce noise
-        if chunk is None:
-            continue
-        buckets.setdefault(agent, []).append(chunk)
-    return {k: "".join(v).strip() for k, v in buckets.items() if "".join(v).strip()}
+# cohos_run already writes these while MassGen streams; this script re-derives them from an existing log.
+
+def load_text(p: Path) -> str:
+    return p.read_text(encoding="utf-8", errors="replace")
 
-def write_artifact(run_dir: Path, rel: str, content: str) -> Path:
-    out = run_dir / rel
-    out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text(content.strip() + "\n", encoding="utf-8")
-    return out
+def reconstruct_from_stdout(stdout_path: Path) -> Dict[str, str]:
+    collector = AgentTextCollector()
+    collector.feed_text(load_text(stdout_path))
+    return collector.texts()
 
 def main() -> int:
     ap = argparse.ArgumentParser()
@@ -42,24 +32,7 @@ def main() -> int:
         raise SystemExit(f"Missing {stdout_path}")
 
     texts = reconstruct_from_stdout(stdout_path)
-
-    # Heuristic mapping by canonical names used in your config
-    gather = texts.get("information_gatherer") or texts.get("gatherer") or ""
-    expert  = texts.get("domain_expert") or texts.get("expert") or ""
-    synth   = texts.get("synthesizer") or texts.get("synth") or ""
-
-    written = []
-    if gather:
-        written.append(write_artifact(run_dir, "artifacts/context_information_gatherer.txt", gather))
-    if expert:
-        written.append(write_artifact(run_dir, "artifacts/candidates_domain_expert.txt", expert))
-    if synth:
-        written.append(write_artifact(run_dir, "artifacts/final_synthesizer.txt", synth))
-
-    # Always write an index for auditability
-    idx = run_dir / "artifacts" / "index.txt"
-    idx.parent.mkdir(parents=True, exist_ok=True)
-    idx.write_text("Written artifacts:\n" + "\n".join(str(p.relative_to(run_dir)) for p in written) + "\n", encoding="utf-8")
+    idx = write_agent_artifacts(run_dir, texts)[-1]
 
     print(str(idx))
     return 0
@@ -43,13 +43,14 @@ def main() -> int:
     env["OPENAI_API_KEY"] = args.api_key
 
     t0 = time.time()
-    with stdout_path.open("w", encoding="utf-8") as out_f, stderr_path.open("w", encoding="utf-8") as err_f:
+    # MassGen writes straight into these fds, so open them unbuffered and skip Python's io layers.
+    with stdout_path.open("wb", buffering=0) as out_f, stderr_path.open("wb", buffering=0) as err_f:
         try:
             cp = subprocess.run(cmd, cwd=str(out), env=env, stdout=out_f, stderr=err_f, text=True)
             rc = int(cp.returncode)
         except Exception as e:
             rc = 2
-            err_f.write(f"\n[LAUNCHER] Exception: {type(e).__name__}: {e}\n")
+            err_f.write(f"\n[LAUNCHER] Exception: {type(e).__name__}: {e}\n".encode("utf-8"))
 
     inv = {
         "schema": "qct.massgen.lmstudio.launch.v1",